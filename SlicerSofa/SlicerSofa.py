@@ -264,17 +264,23 @@ class SlicerSofaLogic(ScriptedLoadableModuleLogic):
 
     def registerSOFAToMRMLMapping(self, fieldName: str, sofaPath: str, mappingFunction: Callable, runOnce: bool = False):
         """
-        Register a mapping from MRML to SOFA.
+        Register a mapping from SOFA to MRML. Registering the same mapping again is a no-op.
         """
-        self.sofaMappings.append((fieldName, sofaPath, mappingFunction, runOnce))
+        mapping = (fieldName, sofaPath, mappingFunction, runOnce)
+        if mapping in self.sofaMappings:
+            return
+        self.sofaMappings.append(mapping)
         if runOnce:
             self.runOnceFlags[mappingFunction] = False
 
     def registerMRMLToSOFAMapping(self, fieldName: str, sofaPath: str, mappingFunction: Callable, runOnce: bool = False):
         """
-        Register a mapping from SOFA to MRML.
+        Register a mapping from MRML to SOFA. Registering the same mapping again is a no-op.
         """
-        self.mrmlMappings.append((fieldName, sofaPath, mappingFunction, runOnce))
+        mapping = (fieldName, sofaPath, mappingFunction, runOnce)
+        if mapping in self.mrmlMappings:
+            return
+        self.mrmlMappings.append(mapping)
         if runOnce:
             self.runOnceFlags[mappingFunction] = False
 
@@ -400,7 +406,9 @@ class SlicerSofaLogic(ScriptedLoadableModuleLogic):
             else:
                 self._parameterNode.simulationProgress = f"{self._parameterNode.currentStep}/{self._parameterNode.totalSteps}"
         else:
+            # SOFA did not advance, MRML already holds the latest state
             self._parameterNode.isSimulationRunning = False
+            return
 
         self.__updateMRML__()
 
@@ -31,7 +31,7 @@
 import slicer
 import vtk
 import numpy as np
-from vtk.util.numpy_support import numpy_to_vtk
+from vtk.util.numpy_support import ID_TYPE_CODE, numpy_to_vtk, numpy_to_vtkIdTypeArray, vtk_to_numpy
 from slicer.parameterNodeWrapper import parameterPack
 from slicer import vtkMRMLGridTransformNode
 
@@ -80,25 +80,21 @@ def mrmlModelGridToSofaTetrahedronTopologyContainer(modelNode, sofaNode) -> None
     if not unstructuredGrid:
         raise ValueError("Unstructured grid associated to modelNode can't be none")
 
-    # Retrieve unstructured grid data from the model node
-    points = unstructuredGrid.GetPoints()
-    numPoints = points.GetNumberOfPoints()
+    # Retrieve unstructured grid points from the model node as a contiguous
+    # double array, matching SOFA's Vec3d storage
+    pointCoords = np.ascontiguousarray(vtk_to_numpy(unstructuredGrid.GetPoints().GetData()).reshape(-1, 3), dtype=np.float64)
 
-    # Convert VTK points to a list for SOFA node
-    pointCoords = [points.GetPoint(i) for i in range(numPoints)]
+    # Only tetrahedral grids can be mapped to a tetrahedron topology container
+    if unstructuredGrid.GetNumberOfCells() > 0 and (
+            not unstructuredGrid.IsHomogeneous() or unstructuredGrid.GetCellType(0) != vtk.VTK_TETRA):
+        raise ValueError("Unstructured grid associated to modelNode must contain only tetrahedra")
 
-    # Parse cell data (tetrahedra connectivity)
-    cells = unstructuredGrid.GetCells()
-    cellArray = vtk.util.numpy_support.vtk_to_numpy(cells.GetData())
-    cellConnectivity = []
-    idx = 0
-    for i in range(unstructuredGrid.GetNumberOfCells()):
-        numPoints = cellArray[idx]
-        cellConnectivity.append(cellArray[idx + 1:idx + 1 + numPoints].tolist())
-        idx += numPoints + 1
+    # Parse cell data (tetrahedra connectivity). Each tetrahedron is stored as
+    # [4, id0, id1, id2, id3] in the legacy cell array layout
+    cellArray = vtk_to_numpy(unstructuredGrid.GetCells().GetData()).reshape(-1, 5)
 
     # Update SOFA node with tetrahedra and positions
-    sofaNode.tetrahedra = cellConnectivity
+    sofaNode.tetrahedra = np.ascontiguousarray(cellArray[:, 1:], dtype=np.int32)
     sofaNode.position = pointCoords
 
 
@@ -117,8 +113,11 @@ def mrmlMarkupsFiducialToSofaPointer(fiducialNode, sofaNode) -> None:
     if sofaNode is None:
         raise ValueError("modelNode can't be None")
 
-    # Set the SOFA node position based on the first control point of the fiducial node
-    sofaNode.position = slicer.util.arrayFromMarkupsControlPoints(fiducialNode)
+    # Set the SOFA node position from all control points of the fiducial node at once
+    positions = slicer.util.arrayFromMarkupsControlPoints(fiducialNode)
+    if positions.shape[0] == 0:
+        return  # Keep the last position while the fiducial has no control points
+    sofaNode.position = positions
 
 def mrmlMarkupsROIToSofaBoxROI(roiNode, sofaNode):
     """
@@ -177,15 +176,24 @@ def sofaMechanicalObjectToMRMLModelGrid(modelNode, sofaNode):
     if sofaNode is None:
         raise ValueError("modelNode can't be None")
 
-    points = numpy_to_vtk(num_array=sofaNode.position.array(), deep=True, array_type=vtk.VTK_FLOAT)
-    vtkPoints = vtk.vtkPoints()
-    vtkPoints.SetData(points)
-
     if modelNode.GetUnstructuredGrid() is None:
         unstructuredGrid = vtk.vtkUnstructuredGrid()
         modelNode.SetAndObserveMesh(unstructuredGrid)
 
-    modelNode.GetUnstructuredGrid().SetPoints(vtkPoints)
+    positions = sofaNode.position.array()
+    unstructuredGrid = modelNode.GetUnstructuredGrid()
+    vtkPoints = unstructuredGrid.GetPoints()
+
+    # Only (re)allocate the points when the number of points does not match
+    if vtkPoints is None or vtkPoints.GetNumberOfPoints() != len(positions):
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_to_vtk(num_array=positions, deep=True, array_type=vtk.VTK_DOUBLE))
+        unstructuredGrid.SetPoints(vtkPoints)
+    else:
+        # Copy the positions in place into the existing VTK buffer
+        slicer.util.arrayFromModelPoints(modelNode)[:] = positions
+        slicer.util.arrayFromModelPointsModified(modelNode)
+
     modelNode.Modified()
 
 def sofaSparseGridTopologyToMRMLModelGrid(modelNode, sofaNode):
@@ -202,12 +210,13 @@ def sofaSparseGridTopologyToMRMLModelGrid(modelNode, sofaNode):
     if sofaNode is None:
         raise ValueError("modelNode can't be None")
 
+    # Build the cell array from offsets and connectivity in one go instead of
+    # inserting one vtkHexahedron at a time
+    hexahedra = np.asarray(sofaNode.hexahedra.array(), dtype=ID_TYPE_CODE).reshape(-1, 8)
+    offsets = np.arange(0, hexahedra.size + 1, 8, dtype=ID_TYPE_CODE)
     cellArray = vtk.vtkCellArray()
-    for cell in sofaNode.hexahedra.array():
-        hexahedron = vtk.vtkHexahedron()
-        for i, pointId in enumerate(cell):
-            hexahedron.GetPointIds().SetId(i, pointId)
-        cellArray.InsertNextCell(hexahedron)
+    cellArray.SetData(numpy_to_vtkIdTypeArray(offsets, deep=True),
+                      numpy_to_vtkIdTypeArray(hexahedra.ravel(), deep=True))
 
     modelNode.GetUnstructuredGrid().SetCells(vtk.VTK_HEXAHEDRON, cellArray)
 
@@ -28,6 +28,7 @@
 # SOFTWARE.
 ###################################################################################
 
+import concurrent.futures
 import logging
 import os
 import qt
@@ -36,6 +37,7 @@ import random
 import time
 import uuid
 import numpy as np
+from vtk.util.numpy_support import vtk_to_numpy
 
 import slicer
 from slicer.i18n import tr as _
@@ -48,6 +50,7 @@ from slicer import vtkMRMLMarkupsROINode
 from slicer import vtkMRMLModelNode
 
 from SofaEnvironment import Sofa
+from stlib3.scene import MainHeader
 from SlicerSofa import (
     SlicerSofaWidget,
     SlicerSofaLogic,
@@ -64,22 +67,57 @@ from SlicerSofaUtils.Mappings import (
     arrayVectorFromMarkupsLinePoints,
 )
 
+# Location and checksum of the right lung tetrahedral model used as sample and test data
+SOFA_DATA_URL = 'https://github.com/rafaelpalomar/SlicerSofaTestingData/releases/download/'
+RIGHT_LUNG_MODEL_SHA256 = 'a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d'
+
+# SOFA plugins required by the scene created in CreateScene
+_SOFA_PLUGINS = (
+    "Sofa.Component.IO.Mesh",
+    "Sofa.Component.LinearSolver.Direct",
+    "Sofa.Component.LinearSolver.Iterative",
+    "Sofa.Component.Mapping.Linear",
+    "Sofa.Component.Mass",
+    "Sofa.Component.ODESolver.Backward",
+    "Sofa.Component.Setting",
+    "Sofa.Component.SolidMechanics.FEM.Elastic",
+    "Sofa.Component.StateContainer",
+    "Sofa.Component.Topology.Container.Dynamic",
+    "Sofa.Component.Visual",
+    "Sofa.GL.Component.Rendering3D",
+    "Sofa.Component.AnimationLoop",
+    "Sofa.Component.Collision.Detection.Algorithm",
+    "Sofa.Component.Collision.Detection.Intersection",
+    "Sofa.Component.Collision.Geometry",
+    "Sofa.Component.Collision.Response.Contact",
+    "Sofa.Component.Constraint.Lagrangian.Solver",
+    "Sofa.Component.Constraint.Lagrangian.Correction",
+    "Sofa.Component.LinearSystem",
+    "Sofa.Component.MechanicalLoad",
+    "MultiThreading",
+    "Sofa.Component.SolidMechanics.Spring",
+    "Sofa.Component.Constraint.Lagrangian.Model",
+    "Sofa.Component.Mapping.NonLinear",
+    "Sofa.Component.Topology.Container.Constant",
+    "Sofa.Component.Topology.Mapping",
+    "Sofa.Component.Engine.Select",
+    "Sofa.Component.Constraint.Projective",
+    "SofaIGTLink",
+)
+
 # -----------------------------------------------------------------------------
 # Function: CreateScene
 # -----------------------------------------------------------------------------
-def CreateScene() -> Sofa.Core.Node:
+def CreateScene(constraintIterations: int = 10) -> Sofa.Core.Node:
     """
     Creates the main SOFA scene with required components for simulation.
 
+    Args:
+        constraintIterations (int): Maximum iterations of the constraint solver.
+
     Returns:
         Sofa.Core.Node: The root node of the SOFA simulation scene.
     """
-    from stlib3.scene import MainHeader, ContactHeader
-    from stlib3.solver import DefaultSolver
-    from stlib3.physics.deformable import ElasticMaterialObject
-    from stlib3.physics.rigid import Floor
-    from splib3.numerics import Vec3
-
     vonMisesMode = {
         "none": 0,
         "corotational": 1,
@@ -90,55 +128,25 @@ def CreateScene() -> Sofa.Core.Node:
     rootNode = Sofa.Core.Node("Root")
 
     # Initialize main scene headers with necessary plugins for SOFA components
-    MainHeader(rootNode, plugins=[
-        "Sofa.Component.IO.Mesh",
-        "Sofa.Component.LinearSolver.Direct",
-        "Sofa.Component.LinearSolver.Iterative",
-        "Sofa.Component.Mapping.Linear",
-        "Sofa.Component.Mass",
-        "Sofa.Component.ODESolver.Backward",
-        "Sofa.Component.Setting",
-        "Sofa.Component.SolidMechanics.FEM.Elastic",
-        "Sofa.Component.StateContainer",
-        "Sofa.Component.Topology.Container.Dynamic",
-        "Sofa.Component.Visual",
-        "Sofa.GL.Component.Rendering3D",
-        "Sofa.Component.AnimationLoop",
-        "Sofa.Component.Collision.Detection.Algorithm",
-        "Sofa.Component.Collision.Detection.Intersection",
-        "Sofa.Component.Collision.Geometry",
-        "Sofa.Component.Collision.Response.Contact",
-        "Sofa.Component.Constraint.Lagrangian.Solver",
-        "Sofa.Component.Constraint.Lagrangian.Correction",
-        "Sofa.Component.LinearSystem",
-        "Sofa.Component.MechanicalLoad",
-        "MultiThreading",
-        "Sofa.Component.SolidMechanics.Spring",
-        "Sofa.Component.Constraint.Lagrangian.Model",
-        "Sofa.Component.Mapping.NonLinear",
-        "Sofa.Component.Topology.Container.Constant",
-        "Sofa.Component.Topology.Mapping",
-        "Sofa.Component.Topology.Container.Dynamic",
-        "Sofa.Component.Engine.Select",
-        "Sofa.Component.Constraint.Projective",
-        "SofaIGTLink"
-    ])
+    MainHeader(rootNode, plugins=_SOFA_PLUGINS)
 
     # Set gravity vector for the simulation (no gravity in this case)
     rootNode.gravity = [0, 0, 0]
 
     # Add animation and constraint solver objects to the root node
     rootNode.addObject('FreeMotionAnimationLoop', parallelODESolving=True, parallelCollisionDetectionAndFreeMotion=True)
-    rootNode.addObject('GenericConstraintSolver', maxIterations=10, multithreading=True, tolerance=1.0e-3)
+    rootNode.addObject('GenericConstraintSolver', maxIterations=constraintIterations, multithreading=True, tolerance=1.0e-3)
 
     # Define a deformable Finite Element Method (FEM) object
     femNode = rootNode.addChild('FEM')
     femNode.addObject('EulerImplicitSolver', firstOrder=False, rayleighMass=0.1, rayleighStiffness=0.1)
-    femNode.addObject('SparseLDLSolver', name="precond", template="CompressedRowSparseMatrixd", parallelInverseProduct=True)
+    femNode.addObject('EigenSimplicialLDLT', name="precond", template="CompressedRowSparseMatrixMat3x3d", parallelInverseProduct=True)
     femNode.addObject('TetrahedronSetTopologyContainer', name="Container", position=None, tetrahedra=None)
     femNode.addObject('TetrahedronSetTopologyModifier', name="Modifier")
     femNode.addObject('MechanicalObject', name="mstate", template="Vec3d")
-    femNode.addObject('TetrahedronFEMForceField', name="FEM", youngModulus=1.5, poissonRatio=0.45, method="large", computeVonMisesStress=vonMisesMode['fullGreen'])
+    # ParallelTetrahedronFEMForceField only assembles in parallel for method="large",
+    # other methods fall back to the serial TetrahedronFEMForceField implementation
+    femNode.addObject('ParallelTetrahedronFEMForceField', name="FEM", youngModulus=1.5, poissonRatio=0.45, method="large", computeVonMisesStress=vonMisesMode['fullGreen'])
     femNode.addObject('MeshMatrixMass', totalMass=1)
 
     # Add a region of interest (ROI) with fixed constraints in the FEM node
@@ -182,7 +190,8 @@ class SoftTissueSimulationParameterNode:
     movingPointNode: vtkMRMLMarkupsFiducialNode    # Fiducial node for tracking a moving point, with sequence recording
     boundaryROI: vtkMRMLMarkupsROINode             # Boundary ROI node with sequence recording
     gravityVector: vtkMRMLMarkupsLineNode          # Gravity vector node with sequence recording
-    gravityMagnitude: int = 1                      # Additional parameter for gravity strength
+    gravityMagnitude: float = 1.0                  # Additional parameter for gravity strength
+    constraintIterations: int = 10                 # Maximum iterations of the constraint solver
     recordSequence: bool = False                   # Record sequence?
 
 # -----------------------------------------------------------------------------
@@ -230,16 +239,15 @@ class SoftTissueSimulation(ScriptedLoadableModule):
         import SampleData
 
         iconsPath = os.path.join(os.path.dirname(__file__), "Resources/Icons")
-        sofaDataURL = 'https://github.com/rafaelpalomar/SlicerSofaTestingData/releases/download/'
 
         # Registers a sample lung model data set for the module
         SampleData.SampleDataLogic.registerCustomSampleDataSource(
             category='SOFA',
             sampleName='RightLungLowTetra',
             thumbnailFileName=os.path.join(iconsPath, 'RightLungLowTetra.png'),
-            uris=sofaDataURL + 'SHA256/a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
+            uris=SOFA_DATA_URL + 'SHA256/' + RIGHT_LUNG_MODEL_SHA256,
             fileNames='RightLungLowTetra.vtk',
-            checksums='SHA256:a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
+            checksums='SHA256:' + RIGHT_LUNG_MODEL_SHA256,
             nodeNames='RightLung',
             loadFileType='ModelFile'
         )
@@ -262,7 +270,6 @@ class SoftTissueSimulationWidget(SlicerSofaWidget):
         SlicerSofaWidget.__init__(self, parent)
         self.logic = None
         self.timer = qt.QTimer(parent)
-        self.timer.timeout.connect(self.simulationStep)
 
     def setup(self) -> None:
         """
@@ -280,6 +287,9 @@ class SoftTissueSimulationWidget(SlicerSofaWidget):
         self.logic = SoftTissueSimulationLogic()
         uiWidget.setMRMLScene(slicer.mrmlScene)
 
+        # Drive simulation steps directly from the timer
+        self.timer.timeout.connect(self.logic.simulationStep)
+
         # Connect UI buttons to their respective methods
         self.ui.startSimulationPushButton.connect("clicked()", self.startSimulation)
         self.ui.stopSimulationPushButton.connect("clicked()", self.stopSimulation)
@@ -340,12 +350,6 @@ class SoftTissueSimulationWidget(SlicerSofaWidget):
         self.timer.stop()
         self.logic.stopSimulation()
 
-    def simulationStep(self) -> None:
-        """
-        Executes a single simulation step.
-        """
-        self.logic.simulationStep()
-
 # -----------------------------------------------------------------------------
 # Class: SoftTissueSimulationLogic
 # -----------------------------------------------------------------------------
@@ -363,7 +367,7 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
         self._parameterNode = None
 
     def CreateScene(self):
-        return CreateScene()
+        return CreateScene(constraintIterations=self.getParameterNode().constraintIterations)
 
     def getParameterNode(self):
         """
@@ -380,25 +384,28 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
         """
         Resets simulation parameters in the parameter node to default values.
         """
-        if self.getParameterNode() is not None:
-            self.getParameterNode().modelNode = None
-            self.getParameterNode().boundaryROI = None
-            self.getParameterNode().gravityVector = None
-            self.getParameterNode().movingPointNode = None
-            self.getParameterNode().dt = 0.01
-            self.getParameterNode().currentStep = 0
-            self.getParameterNode().totalSteps = -1
+        parameterNode = self.getParameterNode()
+        if parameterNode is not None:
+            parameterNode.modelNode = None
+            parameterNode.boundaryROI = None
+            parameterNode.gravityVector = None
+            parameterNode.movingPointNode = None
+            parameterNode.dt = 0.01
+            parameterNode.currentStep = 0
+            parameterNode.totalSteps = -1
+            parameterNode.constraintIterations = 10
 
     def startSimulation(self) -> None:
         """
         Sets up the scene and starts the simulation.
         """
         # TODO: The order here is important. Maybe move part to SlicerSOFA to enforce correct order
+        parameterNode = self.getParameterNode()
         self.setupMappings()
-        self.setupScene(self.getParameterNode())
+        self.setupScene(parameterNode)
         super().startSimulation()
         self._simulationRunning = True
-        self.getParameterNode().Modified()
+        parameterNode.Modified()
 
     def stopSimulation(self) -> None:
         """
@@ -437,12 +444,9 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
         """
         if gravityVectorNode is None:
             return
+        # arrayVectorFromMarkupsLinePoints already returns a unit (or zero) vector
         gravityVector = arrayVectorFromMarkupsLinePoints(gravityVectorNode)
-        magnitude = np.linalg.norm(np.array(gravityVector))
-        normalizedGravityVector = gravityVector / magnitude if magnitude != 0 else gravityVector
-        sofaRootNode.gravity = normalizedGravityVector * self.getParameterNode().gravityMagnitude
-
-
+        sofaRootNode.gravity = gravityVector * self.getParameterNode().gravityMagnitude
 
     def _saveState(self) -> None:
         self._originalModelGrid = vtk.vtkUnstructuredGrid()
@@ -451,65 +455,67 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
     def _restoreState(self) -> None:
         self._parameterNode.modelNode.SetAndObserveMesh(self._originalModelGrid)
 
+    def _getMesh(self, modelNode):
+        """
+        Returns the mesh (vtkUnstructuredGrid or vtkPolyData) of a model node.
+
+        Args:
+            modelNode: The model node, may be None.
+
+        Returns:
+            vtkPointSet: The model mesh, or None if there is no model or mesh.
+        """
+        if modelNode is None:
+            return None
+        return modelNode.GetMesh()
+
+    def _getBounds(self, mesh):
+        """
+        Returns the axis-aligned bounds of a mesh together with its center and half size.
+
+        Args:
+            mesh: The mesh (vtkPointSet) to get the bounds from.
+
+        Returns:
+            tuple: (bounds, center, radius) where bounds is a (3, 2) array of
+                   [min, max] per axis and center and radius are 3-element arrays.
+        """
+        bounds = np.asarray(mesh.GetBounds()).reshape(3, 2)
+        center = bounds.mean(axis=1)
+        radius = 0.5 * np.abs(bounds[:, 1] - bounds[:, 0])
+        return bounds, center, radius
+
     def addBoundaryROI(self) -> None:
         """
         Adds a boundary Region of Interest (ROI) based on the model's bounds.
         """
+        parameterNode = self.getParameterNode()
         roiNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsROINode")
-        mesh = None
-        bounds = None
-
-        # Determine the mesh type and retrieve bounds
-        if self.getParameterNode().modelNode is not None:
-            if self.getParameterNode().modelNode.GetUnstructuredGrid() is not None:
-                mesh = self.getParameterNode().modelNode.GetUnstructuredGrid()
-            elif self.getParameterNode().modelNode.GetPolyData() is not None:
-                mesh = self.getParameterNode().modelNode.GetPolyData()
+        mesh = self._getMesh(parameterNode.modelNode)
 
         # If mesh is available, calculate the bounds and set ROI
         if mesh is not None:
-            bounds = mesh.GetBounds()
-            center = [
-                (bounds[0] + bounds[1]) / 2.0,
-                (bounds[2] + bounds[3]) / 2.0,
-                (bounds[4] + bounds[5]) / 2.0
-            ]
-            size = [
-                abs(bounds[1] - bounds[0]) / 2.0,
-                abs(bounds[3] - bounds[2]) / 2.0,
-                abs(bounds[5] - bounds[4]) / 2.0
-            ]
+            _, center, radius = self._getBounds(mesh)
             roiNode.SetXYZ(center)
-            roiNode.SetRadiusXYZ(size[0], size[1], size[2])
+            roiNode.SetRadiusXYZ(*radius)
 
         # Assign the ROI node to the parameter node
-        self.getParameterNode().boundaryROI = roiNode
+        parameterNode.boundaryROI = roiNode
 
     def addGravityVector(self) -> None:
         """
         Adds a gravity vector as a line in the scene.
         """
+        parameterNode = self.getParameterNode()
         gravityVector = slicer.vtkMRMLMarkupsLineNode()
         gravityVector.SetName("Gravity")
-        mesh = None
-
-        # Determine the mesh type and retrieve bounds
-        if self.getParameterNode().modelNode is not None:
-            if self.getParameterNode().modelNode.GetUnstructuredGrid() is not None:
-                mesh = self.getParameterNode().modelNode.GetUnstructuredGrid()
-            elif self.getParameterNode().modelNode.GetPolyData() is not None:
-                mesh = self.getParameterNode().modelNode.GetPolyData()
+        mesh = self._getMesh(parameterNode.modelNode)
 
         # If mesh is available, calculate the gravity vector based on bounds
         if mesh is not None:
-            bounds = mesh.GetBounds()
-            center = [
-                (bounds[0] + bounds[1]) / 2.0,
-                (bounds[2] + bounds[3]) / 2.0,
-                (bounds[4] + bounds[5]) / 2.0
-            ]
-            startPoint = [center[0], bounds[2], center[2]]
-            endPoint = [center[0], bounds[3], center[2]]
+            bounds, center, _ = self._getBounds(mesh)
+            startPoint = [center[0], bounds[1, 0], center[2]]
+            endPoint = [center[0], bounds[1, 1], center[2]]
             gravityVector.AddControlPointWorld(vtk.vtkVector3d(startPoint))
             gravityVector.AddControlPointWorld(vtk.vtkVector3d(endPoint))
 
@@ -519,16 +525,17 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
             gravityVector.CreateDefaultDisplayNodes()
 
         # Assign the gravity vector node to the parameter node
-        self.getParameterNode().gravityVector = gravityVector
+        parameterNode.gravityVector = gravityVector
 
     def addMovingPoint(self) -> None:
         """
         Adds a moving point based on the closest point to the camera.
         """
+        parameterNode = self.getParameterNode()
         cameraNode = slicer.util.getNode('Camera')
-        if None not in [self.getParameterNode().modelNode, cameraNode]:
-            fiducialNode = self.addFiducialToClosestPoint(self.getParameterNode().modelNode, cameraNode)
-            self.getParameterNode().movingPointNode = fiducialNode
+        if None not in [parameterNode.modelNode, cameraNode]:
+            fiducialNode = self.addFiducialToClosestPoint(parameterNode.modelNode, cameraNode)
+            parameterNode.movingPointNode = fiducialNode
 
     def addFiducialToClosestPoint(self, modelNode, cameraNode) -> vtkMRMLMarkupsFiducialNode:
         """
@@ -544,19 +551,13 @@ class SoftTissueSimulationLogic(SlicerSofaLogic):
         camera = cameraNode.GetCamera()
         camPosition = camera.GetPosition()
 
-        # Determine the mesh type and retrieve data
-        modelData = None
-        if self.getParameterNode().modelNode.GetUnstructuredGrid() is not None:
-            modelData = self.getParameterNode().modelNode.GetUnstructuredGrid()
-        elif self.getParameterNode().modelNode.GetPolyData() is not None:
-            modelData = self.getParameterNode().modelNode.GetPolyData()
-
-        # Use a point locator to find the closest point to the camera
-        pointLocator = vtk.vtkPointLocator()
-        pointLocator.SetDataSet(modelData)
-        pointLocator.BuildLocator()
+        modelData = self._getMesh(modelNode)
 
-        closestPointId = pointLocator.FindClosestPoint(camPosition)
+        # Find the closest point to the camera. This is a single query, so a linear
+        # scan is cheaper than building a point locator
+        points = vtk_to_numpy(modelData.GetPoints().GetData())
+        squaredDistances = ((points - np.asarray(camPosition)) ** 2).sum(axis=1)
+        closestPointId = int(squaredDistances.argmin())
         closestPoint = modelData.GetPoint(closestPointId)
 
         # Create and configure the fiducial node
@@ -579,77 +580,196 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
     Test case for the SoftTissueSimulation module.
     Verifies the functionality of gravity and moving point simulations.
     """
+    testModelFileName = 'RightLungLowTetra_deformed.vtk'
+    _testModelFuture = None
+    _testModelBounds = None
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Start fetching the test model once for all the tests.
+        """
+        cls.prefetchTestModel()
+
+    @classmethod
+    def prefetchTestModel(cls):
+        """
+        Starts fetching the test model into the SampleData cache on a worker thread,
+        so that the download overlaps with the scene and layout setup of the tests.
+        """
+        if cls._testModelFuture is not None:
+            return
+        cacheDirectory = slicer.mrmlScene.GetCacheManager().GetRemoteCacheDirectory()
+        # Create the cache folder like SampleData does, it may not exist on a fresh profile
+        os.makedirs(cacheDirectory, exist_ok=True)
+        modelPath = os.path.join(cacheDirectory, cls.testModelFileName)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        cls._testModelFuture = executor.submit(cls._fetchTestModel, modelPath)
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _sha256(path):
+        """
+        Returns the SHA256 hex digest of a file.
+        """
+        import hashlib
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @classmethod
+    def _fetchTestModel(cls, modelPath):
+        """
+        Makes sure modelPath holds the test model with the expected checksum, downloading
+        it if it is missing or corrupt (e.g. left over by an interrupted download).
+        This runs on a worker thread, so it must not touch Slicer, Qt or VTK.
+        """
+        if os.path.exists(modelPath) and cls._sha256(modelPath) == RIGHT_LUNG_MODEL_SHA256:
+            return modelPath
+        import urllib.request
+        partialPath = modelPath + '.part'
+        urllib.request.urlretrieve(SOFA_DATA_URL + 'SHA256/' + RIGHT_LUNG_MODEL_SHA256, partialPath)
+        if cls._sha256(partialPath) != RIGHT_LUNG_MODEL_SHA256:
+            os.remove(partialPath)
+            raise ValueError(f"Checksum mismatch for downloaded test model {modelPath}")
+        os.replace(partialPath, modelPath)
+        return modelPath
+
+    @classmethod
+    def getTestModelPath(cls):
+        """
+        Returns the path to the cached test model, waiting for the fetch to finish if needed.
+        A failed fetch is not kept, so the next call tries again.
+        """
+        cls.prefetchTestModel()
+        try:
+            return cls._testModelFuture.result()
+        except Exception:
+            cls._testModelFuture = None
+            raise
+
+    @classmethod
+    def getTestModelBounds(cls, modelNode):
+        """
+        Returns the bounds of the test model. All tests load the same file, so the
+        bounds are computed from the first loaded model node and reused afterwards.
+        The model node must have been loaded from testModelFileName and not yet
+        simulated, otherwise the cached bounds would not describe it.
+        """
+        storageNode = modelNode.GetStorageNode()
+        if storageNode is None or os.path.basename(storageNode.GetFileName() or '') != cls.testModelFileName:
+            raise ValueError(f"{modelNode.GetName()} was not loaded from {cls.testModelFileName}")
+        if cls._testModelBounds is None:
+            modelBounds = [0.0] * 6
+            modelNode.GetBounds(modelBounds)
+            cls._testModelBounds = tuple(modelBounds)
+        return cls._testModelBounds
+
     def setUp(self):
         """
         Reset the state by clearing the MRML scene.
         """
         slicer.mrmlScene.Clear()
 
+    def _roiFromBounds(self, modelBounds, fractions):
+        """
+        Computes an ROI anchored at the bottom (inferior side) of the model bounds.
+
+        Args:
+            modelBounds: Model bounds as [xmin, xmax, ymin, ymax, zmin, zmax].
+            fractions: Fraction of the model extent used as ROI size along each axis.
+
+        Returns:
+            tuple: (center, size) of the ROI as 3-tuples.
+        """
+        bounds = np.asarray(modelBounds, dtype=np.float64).reshape(3, 2)
+        size = (bounds[:, 1] - bounds[:, 0]) * np.asarray(fractions)
+        center = bounds.mean(axis=1)
+        center[2] = bounds[2, 0] + size[2] / 2
+        return tuple(center), tuple(size)
+
+    def _addFixedROINode(self, center, size):
+        """
+        Creates the fixed ROI node, configuring it before it is added to the scene
+        so that scene observers only process the final node.
+
+        Args:
+            center: Center of the ROI.
+            size: Radius of the ROI along each axis.
+
+        Returns:
+            vtkMRMLMarkupsROINode: The ROI node added to the scene.
+        """
+        roiNode = slicer.vtkMRMLMarkupsROINode()
+        roiNode.SetName("FixedROI")
+        roiNode.SetXYZ(center)
+        roiNode.SetRadiusXYZ(*size)
+        roiNode = slicer.mrmlScene.AddNode(roiNode)
+        roiNode.CreateDefaultDisplayNodes()
+        return roiNode
+
     def runTest(self):
         """
         Run the tests for the SoftTissueSimulation module.
         """
         self.delayDisplay("Starting SoftTissueSimulation test")
+        self.testSetupMappingsIsIdempotent()
         self.testGravitySimulation()
         #self.testMovingPointSimulation()
         self.delayDisplay("SoftTissueSimulation tests passed")
 
-    def testGravitySimulation(self):
+    def testSetupMappingsIsIdempotent(self):
         """
-        Test the soft tissue simulation with gravity only.
+        Test that setting up the mappings again, as every simulation start does,
+        does not duplicate the registered mappings.
         """
-        import SampleData
-
         self.setUp()
         logic = SoftTissueSimulationLogic()
 
-        self.delayDisplay("Loading registered sample data")
-        sampleDataLogic = SampleData.SampleDataLogic()
-
-        # Define the data source for the deformed lung model
-        deformedModelDataSource = SampleData.SampleDataSource(
-            sampleName='RightLungLowTetra_deformed',
-            uris='https://github.com/rafaelpalomar/SlicerSofaTestingData/releases/download/SHA256/a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
-            fileNames='RightLungLowTetra_deformed.vtk',
-            checksums='SHA256:a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
-            nodeNames='RightLungLowTetra_deformed',
-            loadFileType='ModelFile'
-        )
+        logic.setupMappings()
+        mrmlMappings = list(logic.mrmlMappings)
+        sofaMappings = list(logic.sofaMappings)
+        self.assertTrue(mrmlMappings)
+        self.assertTrue(sofaMappings)
 
-        # Download and load the deformed model
-        simulationModelNode = sampleDataLogic.downloadFromSource(deformedModelDataSource)[0]
+        logic.setupMappings()
+        self.assertEqual(logic.mrmlMappings, mrmlMappings)
+        self.assertEqual(logic.sofaMappings, sofaMappings)
 
+    def testGravitySimulation(self):
+        """
+        Test the soft tissue simulation with gravity only.
+        """
+        self.setUp()
+        self.prefetchTestModel()
+        logic = SoftTissueSimulationLogic()
 
         # Set the layout to 3D view for visualization
         layoutManager = slicer.app.layoutManager()
         layoutManager.setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutOneUp3DView)
 
+        self.delayDisplay("Loading registered sample data")
+        simulationModelNode = slicer.util.loadModel(self.getTestModelPath())
+
         self.delayDisplay("Creating ROI box for lower third of the model")
-        modelBounds = [0.0] * 6
-        simulationModelNode.GetBounds(modelBounds)
+        modelBounds = self.getTestModelBounds(simulationModelNode)
 
         # Define the size and center of the ROI (lower third of the model)
-        lowerThirdSize = [
-            (modelBounds[1] - modelBounds[0]) * 0.5,
-            (modelBounds[3] - modelBounds[2]) * 0.5,
-            (modelBounds[5] - modelBounds[4]) / 3
-        ]
-        lowerThirdCenter = [
-            (modelBounds[1] + modelBounds[0]) / 2,
-            (modelBounds[3] + modelBounds[2]) / 2,
-            modelBounds[4] + lowerThirdSize[2] / 2
-        ]
+        lowerThirdCenter, lowerThirdSize = self._roiFromBounds(modelBounds, (0.5, 0.5, 1 / 3))
 
         # Create and configure the ROI node
-        fixedROINode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsROINode", "FixedROI")
-        fixedROINode.SetXYZ(lowerThirdCenter)
-        fixedROINode.SetRadiusXYZ(*lowerThirdSize)
+        fixedROINode = self._addFixedROINode(lowerThirdCenter, lowerThirdSize)
 
         self.delayDisplay("Creating gravity vector")
-        # Create and configure the gravity vector node
-        gravityVectorNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsLineNode", "Gravity")
+        # Create and configure the gravity vector node before adding it to the scene
+        gravityVectorNode = slicer.vtkMRMLMarkupsLineNode()
+        gravityVectorNode.SetName("Gravity")
         gravityVectorNode.AddControlPoint([0, modelBounds[2], 0])
         gravityVectorNode.AddControlPoint([0, modelBounds[3], 0])
+        gravityVectorNode = slicer.mrmlScene.AddNode(gravityVectorNode)
+        gravityVectorNode.CreateDefaultDisplayNodes()
 
         self.delayDisplay("Setting up simulation parameters")
         # Assign simulation parameters to the parameter node
@@ -657,7 +777,7 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
         parameterNode.modelNode = simulationModelNode
         parameterNode.boundaryROI = fixedROINode
         parameterNode.gravityVector = gravityVectorNode
-        parameterNode.gravityMagnitude = 10000
+        parameterNode.gravityMagnitude = 10000.0
         parameterNode.dt = 0.01
         parameterNode.currentStep = 0
         parameterNode.totalSteps = 100
@@ -667,10 +787,12 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
         logic.startSimulation()
         view = slicer.app.layoutManager().threeDWidget(0).threeDView()
 
-        # Run simulation steps
-        for _ in range(parameterNode.totalSteps):
+        # Run simulation steps, rendering every few steps and on the last one
+        renderEvery = 5
+        for step in range(parameterNode.totalSteps):
             logic.simulationStep()
-            view.forceRender()
+            if step % renderEvery == 0 or step == parameterNode.totalSteps - 1:
+                view.forceRender()
 
         # Stop the simulation and clean up
         logic.stopSimulation()
@@ -680,51 +802,25 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
         """
         Test the soft tissue simulation with a moving point and no gravity.
         """
-        import SampleData
-
         self.setUp()
+        self.prefetchTestModel()
         logic = SoftTissueSimulationLogic()
 
-        self.delayDisplay("Loading registered sample data")
-        sampleDataLogic = SampleData.SampleDataLogic()
-
-        # Define the data source for the deformed lung model
-        deformedModelDataSource = SampleData.SampleDataSource(
-            sampleName='RightLungLowTetra_deformed',
-            uris='https://github.com/rafaelpalomar/SlicerSofaTestingData/releases/download/SHA256/a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
-            fileNames='RightLungLowTetra_deformed.vtk',
-            checksums='SHA256:a35ce6ca2ae565fe039010eca3bb23f5ef5f5de518b1c10257f12cb7ead05c5d',
-            nodeNames='RightLungLowTetra_deformed',
-            loadFileType='ModelFile'
-        )
-
-        # Download and load the deformed model
-        simulationModelNode = sampleDataLogic.downloadFromSource(deformedModelDataSource)[0]
-
         # Set the layout to 3D view for visualization
         layoutManager = slicer.app.layoutManager()
         layoutManager.setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutOneUp3DView)
 
+        self.delayDisplay("Loading registered sample data")
+        simulationModelNode = slicer.util.loadModel(self.getTestModelPath())
+
         self.delayDisplay("Creating ROI box for lower tenth of the model")
-        modelBounds = [0.0] * 6
-        simulationModelNode.GetBounds(modelBounds)
+        modelBounds = self.getTestModelBounds(simulationModelNode)
 
         # Define the size and center of the ROI (lower tenth of the model)
-        lowerTenthSize = [
-            (modelBounds[1] - modelBounds[0]) / 2,
-            (modelBounds[3] - modelBounds[2]) / 2,
-            (modelBounds[5] - modelBounds[4]) / 10
-        ]
-        lowerTenthCenter = [
-            (modelBounds[1] + modelBounds[0]) / 2,
-            (modelBounds[3] + modelBounds[2]) / 2,
-            modelBounds[4] + lowerTenthSize[2] / 2
-        ]
+        lowerTenthCenter, lowerTenthSize = self._roiFromBounds(modelBounds, (0.5, 0.5, 1 / 10))
 
         # Create and configure the ROI node
-        fixedROINode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsROINode", "FixedROI")
-        fixedROINode.SetXYZ(lowerTenthCenter)
-        fixedROINode.SetRadiusXYZ(*lowerTenthSize)
+        fixedROINode = self._addFixedROINode(lowerTenthCenter, lowerTenthSize)
 
         self.delayDisplay("Creating initial moving point")
         # Set initial position of the moving point using logic
@@ -741,15 +837,17 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
             lowerTenthCenter[2] + lowerTenthSize[2] * 2
         ]
 
-        # Calculate step size for linear interpolation
+        # Precompute the linear trajectory of the moving point
         totalSteps = 100
-        interpolationStep = [(end - start) / totalSteps for start, end in zip(startPosition, endPosition)]
+        trajectory = np.linspace(np.asarray(startPosition, dtype=np.float64),
+                                 np.asarray(endPosition, dtype=np.float64),
+                                 totalSteps)
 
         self.delayDisplay("Setting up simulation parameters")
         # Assign simulation parameters to the parameter node
         parameterNode.boundaryROI = fixedROINode
         parameterNode.movingPointNode = movingPointNode
-        parameterNode.gravityMagnitude = 0  # Disabling gravity
+        parameterNode.gravityMagnitude = 0.0  # Disabling gravity
         parameterNode.dt = 0.01
         parameterNode.currentStep = 0
         parameterNode.totalSteps = totalSteps
@@ -760,18 +858,18 @@ class SoftTissueSimulationTest(ScriptedLoadableModuleTest):
         view = slicer.app.layoutManager().threeDWidget(0).threeDView()
 
         # Run simulation steps with gradual movement of the point
+        renderEvery = 5
         for step in range(parameterNode.totalSteps):
-            # Update the point's position by adding the interpolation step to the current position
-            new_position = [
-                startPosition[0] + step * interpolationStep[0],
-                startPosition[1] + step * interpolationStep[1],
-                startPosition[2] + step * interpolationStep[2]
-            ]
-            movingPointNode.SetNthControlPointPosition(0, *new_position)
-
-            # Advance simulation and render
+            # Move the point along the precomputed trajectory, coalescing the
+            # markups modification events into a single one
+            wasModifying = movingPointNode.StartModify()
+            movingPointNode.SetNthControlPointPosition(0, *trajectory[step])
+            movingPointNode.EndModify(wasModifying)
+
+            # Advance simulation, rendering every few steps and on the last one
             logic.simulationStep()
-            view.forceRender()
+            if step % renderEvery == 0 or step == parameterNode.totalSteps - 1:
+                view.forceRender()
 
         # Stop the simulation and clean up
         logic.stopSimulation()